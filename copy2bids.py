@@ -7,6 +7,8 @@ import os
 import re
 import shutil
 import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Tuple
 
@@ -15,40 +17,121 @@ try:
 except ImportError:  # pragma: no cover
     yaml = None
 
-def find_file(source: Path, stem: str, ext: str) -> Optional[Path]:
-    matches = list(source.rglob(f"{stem}{ext}"))
-    return matches[0] if matches else None
+try:
+    import orjson  # type: ignore
+except ImportError:  # pragma: no cover
+    orjson = None
+
+# prefer the libyaml C parser when PyYAML was built against it
+YAML_LOADER = getattr(yaml, "CSafeLoader", None) or getattr(yaml, "SafeLoader", None)
+# orjson is optional; its JSONDecodeError subclasses json.JSONDecodeError
+JSON_LOADS = orjson.loads if orjson is not None else json.loads
+
+def build_file_index(source: str | Path) -> Dict[str, str]:
+    """Walk *source* once and map each file name to its path string (first hit wins)."""
+    index: Dict[str, str] = {}
+    for root, _dirs, files in os.walk(source):
+        for name in files:
+            if name not in index:
+                index[name] = os.path.join(root, name)
+    return index
+
+def find_file(index: Dict[str, str], stem: str, ext: str) -> Optional[str]:
+    return index.get(f"{stem}{ext}")
 
 def load_mapping(cfg_path: Path) -> Dict[str, Any]:
-    text = cfg_path.read_text()
+    # both parsers read the raw bytes straight from the handle, no intermediate str
     if cfg_path.suffix.lower() in {".yaml", ".yml"}:
         if yaml is None:
             sys.exit("PyYAML is required to read YAML configs - install with `pip install pyyaml`.")
-        return yaml.safe_load(text)
+        with cfg_path.open("rb") as fh:
+            return yaml.load(fh, Loader=YAML_LOADER)
     try:
-        return json.loads(text)
+        with cfg_path.open("rb") as fh:
+            return JSON_LOADS(fh.read())
     except json.JSONDecodeError as e:
         sys.exit(f"Config file not valid JSON or YAML: {e}")
 
-def copy_file(src: Path, dst: Path, method: str, dry: bool = False):
+# destination folders already created in this run (only a handful per subject/session)
+MKDIR_CACHE: set[str] = set()
+MKDIR_LOCK = threading.Lock()
+
+# st_dev per folder, so --method auto stats each source/destination folder only once
+DEV_CACHE: Dict[str, int] = {}
+
+def dir_device(path: str) -> int:
+    dev = DEV_CACHE.get(path)
+    if dev is None:
+        dev = DEV_CACHE[path] = os.stat(path).st_dev
+    return dev
+
+# relative path from a destination folder back to a source folder, for symlinks
+RELPATH_CACHE: Dict[Tuple[str, str], str] = {}
+
+def relative_link_target(src: str, dst_dir: str) -> str:
+    src_dir, src_name = os.path.split(src)
+    src_dir = src_dir or os.curdir
+    rel_dir = RELPATH_CACHE.get((src_dir, dst_dir))
+    if rel_dir is None:
+        rel_dir = RELPATH_CACHE[(src_dir, dst_dir)] = os.path.relpath(src_dir, dst_dir)
+    return src_name if rel_dir == os.curdir else os.path.join(rel_dir, src_name)
+
+def copy_file(src: str | os.PathLike, dst: str | os.PathLike, method: str, dry: bool = False):
+    src = os.fspath(src)
+    dst = os.fspath(dst)
     if dry:
         print(f" [DRY] {method.upper():6} {src} -> {dst}")
         return
-    dst.parent.mkdir(parents=True, exist_ok=True)
+    # dirname() is "" for a bare file name; Path.parent gave "." there
+    parent = os.path.dirname(dst) or os.curdir
+    if parent not in MKDIR_CACHE:
+        with MKDIR_LOCK:
+            if parent not in MKDIR_CACHE:
+                os.makedirs(parent, exist_ok=True)
+                MKDIR_CACHE.add(parent)
+    if method == "auto":
+        # hard-link when source and destination share a filesystem, copy otherwise
+        if dir_device(os.path.dirname(src) or os.curdir) == dir_device(parent):
+            try:
+                copy_file(src, dst, "link")
+                return
+            except OSError:  # e.g. filesystem without hard-link support
+                pass
+        method = "copy"
     if method == "copy":
         shutil.copy2(src, dst)
     elif method == "link":
-        if dst.exists():
-            dst.unlink()
-        os.link(src, dst)
+        try:
+            os.link(src, dst)
+        except FileExistsError:
+            os.unlink(dst)
+            os.link(src, dst)
     elif method == "symlink":
-        if dst.exists():
-            dst.unlink()
-        rel = os.path.relpath(src, dst.parent)
-        os.symlink(rel, dst)
+        rel = relative_link_target(src, parent)
+        try:
+            os.symlink(rel, dst)
+        except FileExistsError:
+            os.unlink(dst)
+            os.symlink(rel, dst)
     else:
         raise ValueError(f"Unknown method: {method}")
 
+def run_copy_jobs(jobs: List[Tuple[str, str]], method: str, dry: bool = False, workers: int = 1):
+    """Execute (src, dst) copy jobs; independent files are spread over *workers* threads."""
+    if dry or workers <= 1:
+        # keep dry-run output in mapping order
+        for src, dst in jobs:
+            copy_file(src, dst, method, dry)
+        return
+    # several series can map to one destination (e.g. every anat series -> T1w in bids
+    # naming); never run two writers on one path, keep the last job as a sequential run would
+    last_src: Dict[str, str] = {}
+    for src, dst in jobs:
+        last_src[dst] = src
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        # consume the iterator so worker exceptions propagate
+        list(executor.map(lambda dst: copy_file(last_src[dst], dst, method), last_src))
+
 # -------- parsing utilities --------
 EXT_STRIP = re.compile(r"\.(nii(\.gz)?|json)$", re.I)
 LEADING_INDEX = re.compile(r"^[\s_-]*\d+[\s_-]*")  # fixed: drop leading digits + optional separators
@@ -74,7 +157,6 @@ MOD_PATTERNS: List[Tuple[str, re.Pattern]] = [
     ("rs",   re.compile(r"(?i)(?<![a-z0-9])rs(?![a-z0-9])")),
     ("test", re.compile(r"(?i)(?<![a-z0-9])test(?![a-z0-9])")),
 ]
-RUN_EXPLICIT_END = re.compile(r"(?:^|[_-])run[-_]?(\d{1,2})$", re.I)
 RUN_ANY = re.compile(r"(?:^|[_-])run[-_]?(\d{1,2})\b", re.I)
 
 def parse_sequence(name: str) -> str:
@@ -92,13 +174,11 @@ def parse_modality(name: str) -> str:
 
 
 def parse_run(name: str) -> Optional[str]:
-    m = RUN_EXPLICIT_END.search(name)
-    if m:
-        return f"run-{int(m.group(1)):02d}"
-    matches = list(RUN_ANY.finditer(name))
-    if matches:
-        return f"run-{int(matches[-1].group(1)):02d}"
-    return None
+    # the last run token wins; a trailing "run-NN" is always that last match
+    m = None
+    for m in RUN_ANY.finditer(name):
+        pass
+    return f"run-{int(m.group(1)):02d}" if m else None
 
 def build_custom_name(subject: str, session: str, src_stem: str, idx_for_fallback: int | None = None) -> str:
     n = normalize_stem(src_stem)
@@ -113,9 +193,15 @@ def build_bids_dest_name(subject: str, session: str, suffix: str, ext: str = ".n
     return f"{subject}_{session}_{suffix}{ext}"
 
 # -------- copy routines --------
-def copy_section_list(stems: List[str], source: Path, dest: Path, subject: str, session: str,
-                      method: str, dry: bool, filenaming: str, section: str, counters: Dict[str, int]):
+def copy_section_list(stems: List[str], index: Dict[str, str], dest: str, subject: str, session: str,
+                      filenaming: str, section: str, counters: Dict[str, int]) -> List[Tuple[str, str]]:
+    """Resolve the (src, dst) pairs for one section; copying is left to run_copy_jobs()."""
     assert section in {"anat", "func", "fmap"}
+    if filenaming not in {"preserve", "custom", "bids"}:
+        raise ValueError("Invalid filenaming mode")
+    jobs: List[Tuple[str, str]] = []
+    # plain str paths from here on: os.path.join is much cheaper than Path "/" per file
+    section_dir = os.path.join(dest, subject, session, section)
 
     def bids_suffix_for(sec: str) -> str:
         if sec == "anat":
@@ -132,9 +218,8 @@ def copy_section_list(stems: List[str], source: Path, dest: Path, subject: str,
         if not stem:
             continue
 
-        # compute name stem once per series
-        out_stem_custom: str | None = None
-        out_suffix_bids: str | None = None
+        # compute name stem once per series; None keeps the source file name
+        out_stem: str | None = None
 
         if filenaming == "custom":
             n = normalize_stem(stem)
@@ -155,34 +240,28 @@ def copy_section_list(stems: List[str], source: Path, dest: Path, subject: str,
 
             # Custom naming logic per section
             if section == "func":
-                out_stem_custom = f"{subject}_{session}_{seq}_{mod}_{run}"
+                out_stem = f"{subject}_{session}_{seq}_{mod}_{run}"
             elif section == "anat":
-                out_stem_custom = f"{subject}_{session}_{seq}_{run}"
+                out_stem = f"{subject}_{session}_{seq}_{run}"
             elif section == "fmap":
                 # fmap files always get '_revpe' at the end
-                out_stem_custom = f"{subject}_{session}_{seq}_{run}_revpe"
+                out_stem = f"{subject}_{session}_{seq}_{run}_revpe"
 
         elif filenaming == "bids":
-            out_suffix_bids = bids_suffix_for(section)
+            out_stem = build_bids_dest_name(subject, session, bids_suffix_for(section), ext="")
 
         # Copy .nii.gz and .json
         for ext in (".nii.gz", ".json"):
-            src = find_file(source, stem, ext)
-            if not src or not src.exists():
+            # the index only holds files seen on disk, so no extra exists() stat is needed
+            src = find_file(index, stem, ext)
+            if not src:
                 print(f"WARNING - missing file {stem}{ext}")
                 continue
 
-            if filenaming == "preserve":
-                out_name = src.name
-            elif filenaming == "custom":
-                out_name = f"{out_stem_custom}{ext}"
-            elif filenaming == "bids":
-                out_name = build_bids_dest_name(subject, session, out_suffix_bids, ext)
-            else:
-                raise ValueError("Invalid filenaming mode")
+            out_name = stem + ext if out_stem is None else out_stem + ext
+            jobs.append((src, os.path.join(section_dir, out_name)))
 
-            dst = dest / f"{subject}" / f"{session}" / section / out_name
-            copy_file(src, dst, method, dry)
+    return jobs
 
 def main():  # noqa: C901
     p = argparse.ArgumentParser(description="Copy/link NIfTI series into a flat-mapped BIDS tree (anat/func/fmap lists)")
@@ -191,8 +270,13 @@ def main():  # noqa: C901
     p.add_argument("--config", required=True, type=Path, help="YAML or JSON mapping file (flat lists for anat/func/fmap)")
     p.add_argument("--subject", required=True, help="Subject ID (same for all files)")
     p.add_argument("--session", required=True, help="Session ID (same for all files)")
-    p.add_argument("--method", choices=["copy", "link", "symlink"], default="copy", help="Copy method [copy]")
+    p.add_argument("--method", choices=["copy", "auto", "link", "symlink"], default="copy",
+                   help="Copy method [copy]. auto hard-links when source and dest share a filesystem and "
+                        "copies otherwise; like link, hard-linked outputs share data with the source, so "
+                        "editing them in place (e.g. JSON sidecars) also changes the raw files")
     p.add_argument("--dry", action="store_true", help="Dry-run - print actions only")
+    p.add_argument("--jobs", type=int, default=min(8, os.cpu_count() or 1),
+                   help="Number of parallel copy threads [min(8, CPU count)]")
     p.add_argument(
         "--filenaming",
         choices=["preserve", "custom", "bids"],
@@ -212,10 +296,17 @@ def main():  # noqa: C901
     fmap_list: List[str] = mapping.get("fmap", []) or []
 
     counters: Dict[str, int] = {}
+    # hot paths below work on plain strings rather than Path objects
+    src_root = os.fspath(args.source)
+    dst_root = os.fspath(args.dest)
+    index = build_file_index(src_root)
+
+    jobs: List[Tuple[str, str]] = []
+    jobs += copy_section_list(anat_list, index, dst_root, args.subject, args.session, args.filenaming, "anat", counters)
+    jobs += copy_section_list(func_list, index, dst_root, args.subject, args.session, args.filenaming, "func", counters)
+    jobs += copy_section_list(fmap_list, index, dst_root, args.subject, args.session, args.filenaming, "fmap", counters)
 
-    copy_section_list(anat_list, args.source, args.dest, args.subject, args.session, args.method, args.dry, args.filenaming, "anat", counters)
-    copy_section_list(func_list, args.source, args.dest, args.subject, args.session, args.method, args.dry, args.filenaming, "func", counters)
-    copy_section_list(fmap_list, args.source, args.dest, args.subject, args.session, args.method, args.dry, args.filenaming, "fmap", counters)
+    run_copy_jobs(jobs, args.method, args.dry, args.jobs)
 
     print("\n✔ Done (dry-run)" if args.dry else "\n✔ Finished copying/linking.")
 
@@ -2,17 +2,22 @@
 from __future__ import annotations
 
 import argparse
-import itertools
+import os
 import re
 import sys
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
 from pathlib import Path
-from typing import Dict, List, Any
+from typing import Any, Dict, List, Tuple
 
 try:
     import yaml
 except ImportError:  # pragma: no cover
     sys.exit("PyYAML is required - install with `pip install pyyaml`")
 
+# prefer the libyaml C emitter when PyYAML was built against it
+YAML_DUMPER = getattr(yaml, "CSafeDumper", yaml.SafeDumper)
+
 # Patterns (case-insensitive)
 PAT_ANAT = re.compile(r"(?i)(T1|ADNI|MPRAGE|MP2RAGE|me4|greCAIPI)")
 PAT_FUNC = re.compile(r"(?i)(bold|func|bssfp|vaso|bSSFP)")
@@ -20,18 +25,63 @@ PAT_FMAP = re.compile(r"(?i)(field|revpe)")
 PAT_SKIP = re.compile(r"(?i)(localizer|scout|MPR_Range|intermediate|Start|GLM|Design|MoCo)")
 PAT_SBREF = re.compile(r"SBRef", re.I)
 
-def natural_sort_key(text: str):
-    return [int("".join(g)) if k else "".join(g) for k, g in itertools.groupby(text, str.isdigit)]
+NUM_SPLIT = re.compile(r"(\d+)")
 
-def scan_source(source: Path) -> List[Path]:
-    return sorted(
-        itertools.chain(source.rglob("*.nii"), source.rglob("*.nii.gz")),
-        key=lambda p: natural_sort_key(p.name),
-    )
+def natural_sort_key(text: str):
+    # split() alternates text/digits, so odd slots are always the numeric runs
+    parts: List[Any] = NUM_SPLIT.split(text)
+    parts[1::2] = map(int, parts[1::2])
+    return parts
+
+NIFTI_EXTS = (".nii", ".nii.gz")
+
+def _scan_level(dirpath: str, out: List[Tuple[List[Any], Path]]) -> List[str]:
+    """Collect matching files of one folder into *out* and return its subfolders.
+
+    Unreadable folders are skipped silently, as pathlib's rglob does.
+    """
+    subdirs: List[str] = []
+    try:
+        with os.scandir(dirpath) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                elif entry.name.endswith(NIFTI_EXTS):
+                    # Path objects only for the files we keep
+                    out.append((natural_sort_key(entry.name), Path(entry.path)))
+    except PermissionError:
+        pass
+    return subdirs
+
+def _scan_dir(dirpath: str, out: List[Tuple[List[Any], Path]]) -> None:
+    # a folder's own files come before its subfolders, matching rglob's order
+    for sub in _scan_level(dirpath, out):
+        _scan_dir(sub, out)
+
+def _scan_subtree(dirpath: str) -> List[Tuple[List[Any], Path]]:
+    out: List[Tuple[List[Any], Path]] = []
+    _scan_dir(dirpath, out)
+    return out
+
+def scan_source(source: Path, workers: int = 8) -> List[Path]:
+    # files directly under source are collected here; each first-level subfolder is
+    # walked on its own thread so readdir/stat latency (e.g. on NFS) overlaps
+    found: List[Tuple[List[Any], Path]] = []
+    subdirs = _scan_level(os.fspath(source), found)
+    if subdirs:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for part in executor.map(_scan_subtree, subdirs):
+                found.extend(part)
+
+    # sort keys are built once per file from the DirEntry name (never inside the
+    # comparator); sorting on the key alone keeps ties in scan order
+    found.sort(key=itemgetter(0))
+    return [p for _, p in found]
 
 def series_id(p: Path) -> str:
-    if p.suffix == ".gz" and p.name.endswith(".nii.gz"):
-        return p.name[:-7]
+    name = p.name
+    if name.endswith(".nii.gz"):
+        return name[:-7]
     return p.stem
 
 def categorise(fpaths: List[Path]) -> Dict[str, Any]:
@@ -64,15 +114,10 @@ def categorise(fpaths: List[Path]) -> Dict[str, Any]:
             continue
 
         # if nothing matched, leave it out silently (or add a bucket if you prefer)
-    # deduplicate while preserving order (in case of odd paths)
-    for k in ("anat", "func", "fmap"):
-        seen_k = set()
-        dedup = []
-        for s in mapping[k]:
-            if s not in seen_k:
-                seen_k.add(s)
-                dedup.append(s)
-        mapping[k] = dedup
+    # `seen` already admits each series id once, so the buckets are duplicate-free
+    if __debug__:
+        for k in ("anat", "func", "fmap"):
+            assert len(mapping[k]) == len(set(mapping[k])), f"duplicate series in {k}"
     # drop empty sections for a cleaner YAML
     return {k: v for k, v in mapping.items() if v}
 
@@ -87,7 +132,9 @@ def main():
         sys.exit(f"Source directory not found: {args.source}")
 
     mapping = categorise(scan_source(args.source))
-    yaml_str = yaml.safe_dump(mapping, sort_keys=False)
+    # serialise once with the C emitter; the same text is previewed and written,
+    # so dumping again into the output file would only repeat the work
+    yaml_str = yaml.dump(mapping, Dumper=YAML_DUMPER, sort_keys=False)
 
     print("\nProposed mapping (edit later if needed):\n")
     print(yaml_str)